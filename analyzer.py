@@ -1,31 +1,95 @@
 from sentence_transformers import SentenceTransformer
+import torch
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
 import logging
 from tqdm import tqdm
 import gc  # Pour la gestion de la mémoire
 
+try:
+    # Optionnel : agrégation par page multi-threadée sur CPU
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Modèle ONNX quantifié int8 publié avec les modèles sentence-transformers (CPU AVX2)
+ONNX_QUANTIZED_FILE = "onnx/model_quint8_avx2.onnx"
+
+# Estimation prudente du nombre de caractères par token (WordPiece) pour dimensionner les chunks :
+# le français, les chiffres et les URLs tokenisent plus densément que l'anglais (~4 caractères/token)
+CHARS_PER_TOKEN = 3
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _page_means_normalized(all_embeddings, starts, counts):
+        """Return the L2-normalized mean embedding of each page and the norms of the raw means."""
+        n_pages = starts.shape[0]
+        dim = all_embeddings.shape[1]
+        E = np.zeros((n_pages, dim), dtype=np.float32)
+        norms = np.empty(n_pages, dtype=np.float32)
+        # Une page par thread : somme, moyenne, norme et normalisation en une seule passe
+        for p in prange(n_pages):
+            for k in range(starts[p], starts[p] + counts[p]):
+                for d in range(dim):
+                    E[p, d] += all_embeddings[k, d]
+            sq = 0.0
+            for d in range(dim):
+                E[p, d] /= counts[p]
+                sq += E[p, d] * E[p, d]
+            norm = np.sqrt(sq)
+            norms[p] = norm
+            inv = 1.0 / max(norm, 1e-12)
+            for d in range(dim):
+                E[p, d] *= inv
+        return E, norms
+
 class SiteAnalyzer:
-    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=32):
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=32, quantize=True):
         """Initialize the analyzer with a sentence transformer model."""
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.quantize = quantize
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = self._load_model(model_name)
         except Exception as e:
             logging.warning(f"Error loading model {model_name}: {e}")
             logging.info("Trying with a different model...")
-            self.model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
+            self.model = self._load_model('paraphrase-MiniLM-L3-v2')
         
-        self.embeddings = {}
+        self.urls = []
+        self.url_to_idx = {}
+        self.E = None
+        self.norms = None
         self.central_embedding = None
+        self._sims = None
         self.site_focus_score = None
         self.site_radius = None
         self.batch_size = batch_size
         
-    def _chunk_text(self, text, chunk_size=512, overlap=100):
+        # Taille des chunks en caractères calée sur la fenêtre du modèle, moins [CLS]/[SEP]
+        # (256 tokens → 762 caractères) : au-delà, le modèle tronque silencieusement la fin du chunk
+        max_seq_length = getattr(self.model, "max_seq_length", None) or 128
+        self.chunk_size = (max_seq_length - 2) * CHARS_PER_TOKEN
+        
+    def _load_model(self, model_name):
+        """Load the model on self.device, preferring the int8 ONNX Runtime export on CPU."""
+        # Le modèle quantifié ne sert que sur CPU : sur GPU, PyTorch reste bien plus rapide
+        if self.quantize and self.device == "cpu":
+            try:
+                return SentenceTransformer(
+                    model_name,
+                    device=self.device,
+                    backend="onnx",
+                    model_kwargs={"file_name": ONNX_QUANTIZED_FILE}
+                )
+            except Exception as e:
+                logging.warning(f"Quantized ONNX model unavailable for {model_name}, using PyTorch: {e}")
+        return SentenceTransformer(model_name, device=self.device)
+    
+    def _chunk_text(self, text, chunk_size=None, overlap=100):
         """Split text into chunks of approximately chunk_size characters with overlap."""
+        if chunk_size is None:
+            chunk_size = self.chunk_size
         if len(text) <= chunk_size:
             return [text]
             
@@ -58,73 +122,108 @@ class SiteAnalyzer:
             url_to_chunks[url] = (len(all_chunks), len(chunks))  # Store (start_idx, count)
             all_chunks.extend(chunks)
         
-        # Create embeddings for all chunks in batches to manage memory
-        logging.info(f"Creating embeddings for {len(all_chunks)} text chunks...")
+        # Les chunks répétés d'une page à l'autre (menus, bandeaux cookies...) ne sont encodés qu'une fois :
+        # unique_idx associe chaque texte distinct à sa position dans unique_chunks
+        unique_idx = {}
+        chunk_to_unique = np.fromiter(
+            (unique_idx.setdefault(chunk, len(unique_idx)) for chunk in all_chunks),
+            dtype=np.int64,
+            count=len(all_chunks)
+        )
+        unique_chunks = list(unique_idx)
         
-        # Utiliser des batches pour gérer la mémoire avec de grands sites
-        all_embeddings = []
-        for i in tqdm(range(0, len(all_chunks), self.batch_size), desc="Batches"):
-            batch = all_chunks[i:i + self.batch_size]
-            batch_embeddings = self.model.encode(batch, show_progress_bar=False)
-            all_embeddings.append(batch_embeddings)
-            
-            # Libérer la mémoire après chaque batch
-            if i % (self.batch_size * 10) == 0:
-                gc.collect()
+        # Create embeddings for all chunks
+        logging.info(f"Creating embeddings for {len(unique_chunks)} unique text chunks "
+                     f"(out of {len(all_chunks)}) on {self.device}...")
+        
+        # Un seul appel à encode : la librairie trie les chunks par longueur pour limiter
+        # le padding et découpe elle-même en batches (plus gros sur GPU)
+        batch_size = max(self.batch_size, 128) if self.device == "cuda" else self.batch_size
+        unique_embeddings = self.model.encode(
+            unique_chunks,
+            batch_size=batch_size,
+            show_progress_bar=True,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            device=self.device
+        )
+        # Replacer chaque embedding à la position de son chunk d'origine, directement
+        # dans une matrice float32 pré-allouée (aucune copie s'il n'y a pas de doublon)
+        if len(unique_chunks) == len(all_chunks):
+            all_embeddings = unique_embeddings
+        else:
+            all_embeddings = np.empty((len(all_chunks), unique_embeddings.shape[1]), dtype=np.float32)
+            # mode='clip' : les indices sont valides par construction, et avec le mode par défaut
+            # ('raise') NumPy passe par un tampon temporaire de la taille de out
+            np.take(unique_embeddings, chunk_to_unique, axis=0, out=all_embeddings, mode='clip')
+        del unique_embeddings
         
-        # Concaténer tous les embeddings
-        all_embeddings = np.vstack(all_embeddings)
+        # Organiser les embeddings par URL : les chunks d'une page sont contigus, donc
+        # np.add.reduceat calcule toutes les sommes par page en une seule passe
+        self.urls = list(url_to_chunks.keys())
+        starts = np.array([url_to_chunks[url][0] for url in self.urls], dtype=np.int64)
+        counts = np.array([url_to_chunks[url][1] for url in self.urls], dtype=np.int64)
+        self.url_to_idx = {url: i for i, url in enumerate(self.urls)}
+        all_embeddings = all_embeddings.astype(np.float32, copy=False)
         
-        # Organiser les embeddings par URL
-        for url, (start_idx, count) in url_to_chunks.items():
-            page_embeddings = all_embeddings[start_idx:start_idx + count]
-            # Utiliser la moyenne des embeddings pour représenter la page entière
-            self.embeddings[url] = np.mean(page_embeddings, axis=0)
+        # Utiliser la moyenne des embeddings pour représenter la page entière.
+        # Matrice contiguë (N, D) float32 des embeddings de pages, alignée sur self.urls.
+        # On conserve les normes avant normalisation (utilisées pour l'information density),
+        # puis chaque ligne est normalisée : la similarité cosinus devient un simple produit scalaire
+        if njit is not None and self.device == "cpu":
+            self.E, self.norms = _page_means_normalized(all_embeddings, starts, counts)
+        else:
+            # Divisée sur place pour éviter une copie intermédiaire
+            self.E = np.add.reduceat(all_embeddings, starts, axis=0)
+            self.E /= counts[:, None]
+            self.norms = np.linalg.norm(self.E, axis=1)
+            self.E /= np.maximum(self.norms, 1e-12)[:, None]
+        self._sims = None
         
         # Libérer la mémoire
         del all_embeddings
         gc.collect()
         
-        logging.info(f"Created embeddings for {len(self.embeddings)} pages.")
-        return self.embeddings
+        logging.info(f"Created embeddings for {len(self.urls)} pages.")
+        return self.E
+    
+    def get_embedding(self, url):
+        """Return the (normalized) embedding of a page."""
+        return self.E[self.url_to_idx[url]]
     
     def calculate_central_embedding(self):
         """Calculate the central embedding (semantic center) of the site."""
-        if not self.embeddings:
+        if self.E is None or not self.urls:
             raise ValueError("No embeddings available. Run create_embeddings first.")
             
-        # Use the mean of all page embeddings as the central embedding
-        all_embeddings = np.array(list(self.embeddings.values()))
-        self.central_embedding = np.mean(all_embeddings, axis=0)
+        # Use the mean of all page embeddings as the central embedding.
+        # Rows of self.E are normalized, so weighting them by their original norms
+        # gives back the mean of the raw page embeddings without rebuilding them.
+        center = (self.norms @ self.E) / len(self.urls)
+        # Store it normalized so that cosine similarity is a plain dot product
+        self.central_embedding = center / max(np.linalg.norm(center), 1e-12)
+        self._sims = None
         return self.central_embedding
     
+    def _compute_similarities(self):
+        """Return the cosine similarity of every page to the central embedding, in self.urls order."""
+        # Un seul produit matrice-vecteur, partagé par le focus score, le radius et les métriques par page
+        if self._sims is None:
+            if self.central_embedding is None:
+                self.calculate_central_embedding()
+            self._sims = self.E @ self.central_embedding
+        return self._sims
+    
     def calculate_site_focus_score(self):
         """Calculate the site focus score based on cosine similarity to central embedding."""
-        if self.central_embedding is None:
-            self.calculate_central_embedding()
-            
-        similarities = []
-        for url, embedding in self.embeddings.items():
-            similarity = cosine_similarity([embedding], [self.central_embedding])[0][0]
-            similarities.append(similarity)
-            
         # Site focus score is the average similarity to the central embedding
-        self.site_focus_score = np.mean(similarities)
+        self.site_focus_score = self._compute_similarities().mean()
         return self.site_focus_score
     
     def calculate_site_radius(self):
         """Calculate the site radius (average distance from central embedding)."""
-        if self.central_embedding is None:
-            self.calculate_central_embedding()
-            
-        distances = []
-        for url, embedding in self.embeddings.items():
-            # Convert similarity to distance (1 - similarity)
-            distance = 1 - cosine_similarity([embedding], [self.central_embedding])[0][0]
-            distances.append(distance)
-            
-        # Site radius is the average distance from the central embedding
-        self.site_radius = np.mean(distances)
+        # Site radius is the average distance (1 - similarity) from the central embedding
+        self.site_radius = 1 - self._compute_similarities().mean()
         return self.site_radius
     
     def analyze_site(self, pages_content):
@@ -134,67 +233,53 @@ class SiteAnalyzer:
         focus_score = self.calculate_site_focus_score()
         radius = self.calculate_site_radius()
         
-        # Get page-level metrics for detailed analysis
-        page_metrics = {}
+        # Similarités déjà calculées pour le focus score et le radius
+        urls = self.urls
+        similarities = self._compute_similarities()
+        distances = 1 - similarities
+        
+        # Calculer une métrique d'information density (approximation)
+        # Basée sur la norme du vecteur d'embedding, normalisée pour l'affichage et limitée entre 0 et 1
+        densities = np.clip(self.norms / 10, 0, 1)
+        
+        # Catégorie de chaque page selon son alignement avec le centre
+        categories = np.where(similarities >= 0.8, "core",
+                              np.where(similarities >= 0.6, "supporting", "peripheral"))
         
-        # Pour calculer la distribution de similarité
-        similarity_distribution = {
-            "0.0-0.1": 0, "0.1-0.2": 0, "0.2-0.3": 0, "0.3-0.4": 0, "0.4-0.5": 0,
-            "0.5-0.6": 0, "0.6-0.7": 0, "0.7-0.8": 0, "0.8-0.9": 0, "0.9-1.0": 0
+        # Colonnes converties une seule fois en types Python natifs,
+        # puis assemblées en dicts uniquement à la sortie
+        sims_list = similarities.tolist()
+        dists_list = distances.tolist()
+        dens_list = densities.tolist()
+        cats_list = categories.tolist()
+        
+        # Get page-level metrics for detailed analysis
+        page_metrics = {
+            url: {"similarity": s, "distance": d, "information_density": y}
+            for url, s, d, y in zip(urls, sims_list, dists_list, dens_list)
         }
         
-        # Pour calculer la composition du contenu
+        # Pour la visualisation des clusters :
+        # x = alignement topique (plus élevé = plus aligné), y = densité d'information
+        content_clusters = [
+            {"url": url, "x": s, "y": y, "category": c}
+            for url, s, y, c in zip(urls, sims_list, dens_list, cats_list)
+        ]
+        
+        # Distribution de similarité : histogramme en 10 tranches de 0.1
+        buckets = np.clip((similarities * 10).astype(np.int64), 0, 9)
+        hist = np.bincount(buckets, minlength=10)
+        similarity_distribution = {f"{b/10:.1f}-{(b+1)/10:.1f}": int(hist[b]) for b in range(10)}
+        
+        # Composition du contenu
+        core_count = int((similarities >= 0.8).sum())
+        supporting_count = int(((similarities >= 0.6) & (similarities < 0.8)).sum())
         content_composition = {
-            "core": 0,      # Pages très similaires au centre (>0.8)
-            "supporting": 0, # Pages moyennement similaires (0.6-0.8)
-            "peripheral": 0  # Pages peu similaires (<0.6)
+            "core": core_count,                 # Pages très similaires au centre (>0.8)
+            "supporting": supporting_count,     # Pages moyennement similaires (0.6-0.8)
+            "peripheral": len(urls) - core_count - supporting_count  # Pages peu similaires (<0.6)
         }
         
-        # Pour la visualisation des clusters
-        content_clusters = []
-        
-        # Traiter les pages par lots pour économiser la mémoire
-        urls = list(self.embeddings.keys())
-        for i in range(0, len(urls), 100):
-            batch_urls = urls[i:i+100]
-            for url in batch_urls:
-                embedding = self.embeddings[url]
-                similarity = cosine_similarity([embedding], [self.central_embedding])[0][0]
-                distance = 1 - similarity
-                
-                # Calculer une métrique d'information density (approximation)
-                # Basée sur la norme du vecteur d'embedding
-                information_density = np.linalg.norm(embedding) / 10  # Normalisé pour l'affichage
-                information_density = min(max(information_density, 0), 1)  # Limiter entre 0 et 1
-                
-                page_metrics[url] = {
-                    "similarity": similarity,
-                    "distance": distance,
-                    "information_density": information_density
-                }
-                
-                # Ajouter les données pour la visualisation des clusters
-                category = "core" if similarity >= 0.8 else "supporting" if similarity >= 0.6 else "peripheral"
-                content_clusters.append({
-                    "url": url,
-                    "x": similarity,  # Alignement topique (plus élevé = plus aligné)
-                    "y": information_density,  # Densité d'information
-                    "category": category
-                })
-                
-                # Mettre à jour la distribution de similarité
-                bucket = min(int(similarity * 10), 9)
-                bucket_key = f"{bucket/10:.1f}-{(bucket+1)/10:.1f}"
-                similarity_distribution[bucket_key] += 1
-                
-                # Mettre à jour la composition du contenu
-                if similarity >= 0.8:
-                    content_composition["core"] += 1
-                elif similarity >= 0.6:
-                    content_composition["supporting"] += 1
-                else:
-                    content_composition["peripheral"] += 1
-        
         # Calculer les pourcentages pour la composition du contenu
         total_pages = len(urls)
         content_composition_percentages = {
@@ -5,12 +5,14 @@ from fastapi.responses import FileResponse
 from pydantic import BaseModel, HttpUrl
 import uvicorn
 import os
-import json
-import numpy as np
+import orjson
+import hashlib
 from typing import Dict, List, Optional
 import logging
 import time
 import argparse
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
 import traceback
 
@@ -20,17 +22,6 @@ from analyzer import SiteAnalyzer
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Custom JSON encoder to handle NumPy types
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NumpyEncoder, self).default(obj)
-
 # Get command line arguments
 def get_args():
     try:
@@ -64,8 +55,25 @@ os.makedirs("static", exist_ok=True)
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Store ongoing tasks
-tasks_status = {}
+# Store ongoing tasks (LRU-bounded: the oldest tasks are evicted beyond MAX_TASKS)
+MAX_TASKS = 1000
+tasks_status = OrderedDict()
+tasks_lock = asyncio.Lock()
+
+def _store_task_status(task_id, **fields):
+    """Merge fields into a task's status and evict the oldest tasks. Caller must hold tasks_lock."""
+    # Une tâche absente (jamais vue ou évincée) repart d'un statut complet
+    if task_id not in tasks_status:
+        tasks_status[task_id] = {"status": "running", "progress": 0, "message": None}
+    tasks_status[task_id].update(fields)
+    tasks_status.move_to_end(task_id)
+    while len(tasks_status) > MAX_TASKS:
+        tasks_status.popitem(last=False)
+
+async def set_task_status(task_id, **fields):
+    """Update the status of a task."""
+    async with tasks_lock:
+        _store_task_status(task_id, **fields)
 
 class AnalysisRequest(BaseModel):
     url: HttpUrl
@@ -88,18 +96,16 @@ async def analyze_site(request: AnalysisRequest, background_tasks: BackgroundTas
     # Use request max_pages if provided, otherwise use command line arg
     max_pages = request.max_pages or args.max_pages
     
-    task_id = str(hash(f"{request.url}_{max_pages}"))
+    # Identifiant stable entre processus (hash() est salé à chaque démarrage)
+    task_id = hashlib.sha1(f"{request.url}|{max_pages}|{request.same_domain_only}".encode()).hexdigest()[:16]
     
-    # Check if task is already running
-    if task_id in tasks_status and tasks_status[task_id]["status"] == "running":
-        return {"task_id": task_id, "status": "running"}
-    
-    # Initialize task status
-    tasks_status[task_id] = {
-        "status": "running",
-        "progress": 0,
-        "message": "Starting analysis..."
-    }
+    async with tasks_lock:
+        # Check if task is already running
+        if task_id in tasks_status and tasks_status[task_id].get("status") == "running":
+            return {"task_id": task_id, "status": "running"}
+        
+        # Initialize task status
+        _store_task_status(task_id, status="running", progress=0, message="Starting analysis...")
     
     # Start background task
     background_tasks.add_task(
@@ -115,13 +121,15 @@ async def analyze_site(request: AnalysisRequest, background_tasks: BackgroundTas
 @app.get("/task/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
     """Get the status of a running task."""
-    if task_id not in tasks_status:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    return {
-        "task_id": task_id,
-        **tasks_status[task_id]
-    }
+    async with tasks_lock:
+        status = tasks_status.get(task_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        
+        return {
+            "task_id": task_id,
+            **status
+        }
 
 @app.get("/results/{task_id}")
 async def get_results(task_id: str):
@@ -131,8 +139,8 @@ async def get_results(task_id: str):
     if not os.path.exists(result_file):
         raise HTTPException(status_code=404, detail="Results not found")
     
-    with open(result_file, "r") as f:
-        results = json.load(f)
+    with open(result_file, "rb") as f:
+        results = orjson.loads(f.read())
     
     return results
 
@@ -140,11 +148,7 @@ async def run_analysis(task_id, url, max_pages=200, same_domain_only=True):
     """Run the full analysis process."""
     try:
         # Update task status
-        tasks_status[task_id] = {
-            'status': 'running',
-            'progress': 0.1,
-            'message': 'Initialisation du crawler...'
-        }
+        await set_task_status(task_id, status='running', progress=0.1, message='Initialisation du crawler...')
         
         # Create crawler instance
         crawler = WebCrawler(
@@ -155,15 +159,13 @@ async def run_analysis(task_id, url, max_pages=200, same_domain_only=True):
         )
         
         # Update task status
-        tasks_status[task_id]['progress'] = 0.2
-        tasks_status[task_id]['message'] = 'Crawling du site web...'
+        await set_task_status(task_id, progress=0.2, message='Crawling du site web...')
         
-        # Crawl the website - crawl_parallel n'est pas une coroutine async, donc pas de await
-        pages_content = crawler.crawl_parallel(url)
+        # Crawl the website - crawl_async tourne dans la boucle d'événements de l'application
+        pages_content = await crawler.crawl_async(url)
         
         # Update task status
-        tasks_status[task_id]['progress'] = 0.6
-        tasks_status[task_id]['message'] = 'Création des embeddings...'
+        await set_task_status(task_id, progress=0.6, message='Création des embeddings...')
         
         # Create analyzer instance
         analyzer = SiteAnalyzer()
@@ -172,8 +174,7 @@ async def run_analysis(task_id, url, max_pages=200, same_domain_only=True):
         results = analyzer.analyze_site(pages_content)
         
         # Update task status
-        tasks_status[task_id]['progress'] = 0.9
-        tasks_status[task_id]['message'] = 'Finalisation des résultats...'
+        await set_task_status(task_id, progress=0.9, message='Finalisation des résultats...')
         
         # Add metadata to results
         results['metadata'] = {
@@ -183,27 +184,19 @@ async def run_analysis(task_id, url, max_pages=200, same_domain_only=True):
             'max_pages': max_pages
         }
         
-        # Save results using the custom NumPy encoder
+        # Save results (orjson sérialise nativement les types NumPy)
         result_file = os.path.join("results", f"results_{task_id}.json")
-        with open(result_file, "w") as f:
-            json.dump(results, f, cls=NumpyEncoder)
+        with open(result_file, "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS))
         
         # Update task status
-        tasks_status[task_id] = {
-            'status': 'completed',
-            'progress': 1.0,
-            'message': 'Analyse terminée'
-        }
+        await set_task_status(task_id, status='completed', progress=1.0, message='Analyse terminée')
         
         return results
         
     except Exception as e:
         # Update task status on error
-        tasks_status[task_id] = {
-            'status': 'failed',
-            'progress': 0,
-            'message': str(e)
-        }
+        await set_task_status(task_id, status='failed', progress=0, message=str(e))
         logging.error(f"Error in analysis: {str(e)}")
         traceback.print_exc()
         raise
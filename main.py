@@ -37,8 +37,8 @@ def check_dependencies():
         import uvicorn
         from fastapi import FastAPI
         import numpy as np
-        from bs4 import BeautifulSoup
-        import requests
+        from selectolax.lexbor import LexborHTMLParser
+        import aiohttp
         
         # Vérification optionnelle de sentence-transformers
         try: